@@ -1,5 +1,114 @@
 import math
-import matplotlib.pyplot as plt
+import os
+import sys
+import numpy as np
+import matplotlib
+from numba import njit, prange
+
+SAVE_FIGURES = os.environ.get('SAVE_FIGURES', '').lower() not in ('', '0', 'false')
+if SAVE_FIGURES:
+    matplotlib.use('Agg')
+
+import matplotlib.pyplot as plt  # noqa: E402
+
+EULER, IMPROVED_EULER, RUNGE_KUTTA = 0, 1, 2
+
+
+@njit(fastmath=True, cache=True)
+def _fprime(x, y, x_cos):
+    return y / x + x_cos
+
+
+@njit(fastmath=True, cache=True)
+def _fexact(x):
+    return x * np.sin(x) + 1
+
+
+@njit(fastmath=True, cache=True)
+def _euler_next(x, y, y_exact, h, x_cos):
+    return y + h * _fprime(x, y, x_cos), y_exact + h * _fprime(x, y_exact, x_cos)
+
+
+@njit(fastmath=True, cache=True)
+def _improved_euler_next(x, y, y_exact, h, x_cos, x_mid_cos):
+    x_mid = x + h / 2
+    y_mid = y + h / 2 * _fprime(x, y, x_cos)
+    y_exact_mid = y_exact + h / 2 * _fprime(x, y_exact, x_cos)
+    return y + h * _fprime(x_mid, y_mid, x_mid_cos), y_exact + h * _fprime(x_mid, y_exact_mid, x_mid_cos)
+
+
+@njit(fastmath=True, cache=True)
+def _runge_kutta_next(x, y, y_exact, h, x_cos, x_mid_cos, x_end_cos):
+    h2 = h * 0.5
+    h6 = h * (1.0 / 6.0)
+    x_mid = x + h2
+    x_end = x + h
+
+    k1 = _fprime(x, y, x_cos)
+    k2 = _fprime(x_mid, y + h2 * k1, x_mid_cos)
+    k3 = _fprime(x_mid, y + h2 * k2, x_mid_cos)
+    k4 = _fprime(x_end, y + h * k3, x_end_cos)
+
+    k1e = _fprime(x, y_exact, x_cos)
+    k2e = _fprime(x_mid, y_exact + h2 * k1e, x_mid_cos)
+    k3e = _fprime(x_mid, y_exact + h2 * k2e, x_mid_cos)
+    k4e = _fprime(x_end, y_exact + h * k3e, x_end_cos)
+
+    return y + h6 * (k1 + 2.0 * (k2 + k3) + k4), y_exact + h6 * (k1e + 2.0 * (k2e + k3e) + k4e)
+
+
+@njit(fastmath=True, cache=True)
+def _integrate(xs, y_exact, x_cos_half, y0, h, method_id):
+    n = xs.shape[0]
+    ys = np.empty(n)
+    ys_from_exact = np.empty(n)
+    ys[0] = ys_from_exact[0] = y0
+    x_prev, y_prev, y_exact_prev = xs[0], y0, y_exact[0]
+    for i in range(1, n):
+        if method_id == EULER:
+            y_prev, ys_from_exact[i] = _euler_next(x_prev, y_prev, y_exact_prev, h, x_cos_half[2 * i - 2])
+        elif method_id == IMPROVED_EULER:
+            y_prev, ys_from_exact[i] = _improved_euler_next(x_prev, y_prev, y_exact_prev, h,
+                                                            x_cos_half[2 * i - 2], x_cos_half[2 * i - 1])
+        else:
+            y_prev, ys_from_exact[i] = _runge_kutta_next(x_prev, y_prev, y_exact_prev, h,
+                                                         x_cos_half[2 * i - 2], x_cos_half[2 * i - 1],
+                                                         x_cos_half[2 * i])
+        ys[i] = y_prev
+        x_prev, y_exact_prev = xs[i], y_exact[i]
+    return ys, ys_from_exact
+
+
+@njit(fastmath=True, cache=True)
+def _max_gte(ys, y_exact):
+    max_gte = 0.0
+    for i in range(ys.shape[0]):
+        gte = abs(y_exact[i] - ys[i])
+        if gte > max_gte:
+            max_gte = gte
+    return max_gte
+
+
+@njit(cache=True)
+def _grid(x0, h, n):
+    xs = x0 + np.arange(n) * h
+    xs_half = x0 + np.arange(2 * n - 1) * (h / 2)
+    return xs, _fexact(xs), xs_half * np.cos(xs_half)
+
+
+@njit(fastmath=True, cache=True, parallel=True)
+def _gte_sweep(x0, x_end, y0, max_num_of_steps, method_id):
+    m = max(max_num_of_steps - 1, 0)
+    steps = np.empty(m)
+    max_gtes = np.empty(m)
+    for j in prange(m):
+        num_of_steps = max_num_of_steps - j
+        h = (x_end - x0) / num_of_steps
+        xs, y_exact, x_cos_half = _grid(x0, h, num_of_steps + 1)
+        ys, _ = _integrate(xs, y_exact, x_cos_half, y0, h, method_id)
+        steps[j] = h
+        max_gtes[j] = _max_gte(ys, y_exact)
+    return steps, max_gtes
 
 
 class GraphEditor:
@@ -30,18 +139,22 @@ class GraphEditor:
         self.gte_investigation_graph.set_xlabel('step')
         self.gte_investigation_graph.set_ylabel('GTE')
 
+    @staticmethod
+    def draw_points(graph, xs, ys, color, label):
+        graph.plot(xs, ys, marker='.', linestyle='None', color=color, markersize=2, label=label)
+
     @staticmethod
     def generate_legend(graph, is_methods):
         if is_methods:
             leg = graph.legend(["exact_solution", "euler", "improved_euler", "runge_kutta"],
                                loc='upper center', fancybox=True, ncol=4)
             colors = ["black", "green", "blue", "orange"]
-            for i, j in enumerate(leg.legendHandles):
+            for i, j in enumerate(leg.legend_handles):
                 j.set_color(colors[i])
         else:
             leg = graph.legend(["euler", "improved_euler", "runge_kutta"], loc='upper center', fancybox=True, ncol=4)
             colors = ["green", "blue", "orange"]
-            for i, j in enumerate(leg.legendHandles):
+            for i, j in enumerate(leg.legend_handles):
                 j.set_color(colors[i])
 
     def show_figure(self):
@@ -51,7 +164,11 @@ class GraphEditor:
         self.generate_legend(self.gte_fig, False)
         self.generate_legend(self.gte_investigation_graph, False)
 
-        plt.show()
+        if SAVE_FIGURES:
+            for fig in (self.solution_fig, self.lte_fig, self.gte_fig, self.gte_investigation_fig):
+                fig.savefig(fig.get_label() + '.png', dpi=300)
+        else:
+            plt.show()
 
 
 class Equation:
@@ -63,38 +180,55 @@ class Equation:
 
 
 class DifferentialEquation(Equation):
-    def __init__(self, x0, x, y0, graph_editor: GraphEditor):
+    def __init__(self, x0, x, y0, step, graph_editor: GraphEditor):
         Equation.__init__(self, x0, x, y0, graph_editor)
+        self.step = step
+        self._step_grid = None
 
     @staticmethod
-    def get_y_prime(x, y):
-        return y / x + x * math.cos(x)
+    def get_y_prime(x, y, _cos=math.cos):
+        return y / x + x * _cos(x)
 
     @staticmethod
-    def get_y(x):
-        return x * math.sin(x) + 1
+    def get_y(x, _sin=math.sin):
+        return x * _sin(x) + 1
 
     @staticmethod
-    def print_format(x, y):
-        print('x:', '{:.2f}'.format(x), end=' ')
-        print('y(', 'exact', '):', sep='', end=' ')
-        print('{:.4f}'.format(y))
+    def line_format(x, y):
+        return f'x: {x:.2f} y(exact): {y:.4f}'
+
+    def grid(self, step):
+        if step != self.step:
+            return self.build_grid(step)
+        if self._step_grid is None:
+            self._step_grid = self.build_grid(step)
+        return self._step_grid
+
+    def build_grid(self, step):
+        if step == 0:
+            raise ValueError('STEP must not be zero')
+        x0 = self.x0
+        n = int(round((self.x - x0) / step)) + 1
+        if n < 1:
+            raise ValueError('X must be reachable from X0 with the given STEP')
+        return _grid(float(x0), float(step), n)
 
     def exact_solution(self, step):
-        print('Exact solution:')
-        k = self.x0
+        xs, y_exact, _ = self.grid(step)
 
-        while k < self.x + step:
-            self.graph_editor.solution_graph.scatter(k, self.get_y(k), s=2, color='black', label='exact')
-            self.print_format(k, self.get_y(k))
-            k += step
+        self.graph_editor.draw_points(self.graph_editor.solution_graph, xs, y_exact, 'black', 'exact')
+        lines = ['Exact solution:']
+        line_format = self.line_format
+        lines.extend(line_format(x, y) for x, y in zip(xs, y_exact))
+        sys.stdout.write('\n'.join(lines) + '\n')
 
 
 class NumericalMethod:
     def __init__(self, step, differential_equation: DifferentialEquation, graph_editor: GraphEditor,
-                 method_name, method_color):
+                 method_name, method_color, method_id):
         self.method_name = method_name
         self.method_color = method_color
+        self.method_id = method_id
         self.step = step
         self.differential_equation = differential_equation
         self.graph_editor = graph_editor
@@ -107,95 +241,58 @@ class NumericalMethod:
     def get_lte(y_from_exact, y_exact):
         return abs(y_exact - y_from_exact)
 
-    def print_format(self, x, y, lte, gte):
-        print('x:', '{:.2f}'.format(x), end=' ')
-        print('y(', self.method_name, '):', sep='', end=' ')
-        print('{:.4f}'.format(y), 'LTE:', '{:.4f}'.format(lte), 'GTE:', '{:.4f}'.format(gte))
+    def line_format(self, x, y, lte, gte):
+        return f'x: {x:.2f} y({self.method_name}): {y:.4f} LTE: {lte:.4f} GTE: {gte:.4f}'
 
     def supplement_graph(self, x, y, lte, gte):
-        self.graph_editor.gte_graph.scatter(x, gte, s=2, color=self.method_color, label=self.method_name)
-        self.graph_editor.lte_graph.scatter(x, lte, s=2, color=self.method_color, label=self.method_name)
-        self.graph_editor.solution_graph.scatter(x, y, s=2, color=self.method_color, label=self.method_name)
+        self.graph_editor.draw_points(self.graph_editor.gte_graph, x, gte, self.method_color, self.method_name)
+        self.graph_editor.draw_points(self.graph_editor.lte_graph, x, lte, self.method_color, self.method_name)
+        self.graph_editor.draw_points(self.graph_editor.solution_graph, x, y, self.method_color, self.method_name)
 
-    def method_implementation(self, step, with_print, with_gte_max, calculate_next):
-        gte_arr = []
-
-        y_prev = self.differential_equation.y0
-        x_prev = self.differential_equation.x0
-        k = self.differential_equation.x0 + step
-
-        gte = self.get_gte(y_prev, DifferentialEquation.get_y(x_prev))
-        lte = self.get_lte(y_prev, DifferentialEquation.get_y(x_prev))
-
-        if with_gte_max:
-            gte_arr.append(gte)
+    def method_implementation(self, step, with_print, with_gte_max):
+        de = self.differential_equation
+        xs, y_exact, x_cos_half = de.grid(step)
+        ys, ys_from_exact = _integrate(xs, y_exact, x_cos_half, float(de.y0), float(step), self.method_id)
 
         if with_print:
-            print(self.method_name, ':', sep='')
-            self.supplement_graph(x_prev, y_prev, lte, gte)
-            self.print_format(x_prev, y_prev, lte, gte)
+            gtes = self.get_gte(ys, y_exact)
+            ltes = self.get_lte(ys_from_exact, y_exact)
 
-        while k <= self.differential_equation.x + step:
-            y_next = calculate_next(x_prev, y_prev)
-            x_next = k
-
-            gte = self.get_gte(y_next, DifferentialEquation.get_y(x_next))
-            lte = self.get_lte(calculate_next(x_prev, DifferentialEquation.get_y(x_prev)),
-                               DifferentialEquation.get_y(x_next))
-
-            if with_gte_max:
-                gte_arr.append(gte)
-
-            if with_print:
-                self.supplement_graph(x_next, y_next, lte, gte)
-                self.print_format(x_next, y_next, lte, gte)
-
-            x_prev = x_next
-            y_prev = y_next
-            k += step
+            self.supplement_graph(xs, ys, ltes, gtes)
+            lines = [self.method_name + ':']
+            line_format = self.line_format
+            lines.extend(line_format(x, y, lte, gte) for x, y, lte, gte in zip(xs, ys, ltes, gtes))
+            sys.stdout.write('\n'.join(lines) + '\n')
 
         if with_gte_max:
-            return max(gte_arr)
+            return _max_gte(ys, y_exact)
+
+    def gte_investigation(self, max_num_of_steps):
+        de = self.differential_equation
+        if de.x == de.x0:
+            return
 
-    def gte_investigation(self, calculate_next, max_num_of_steps):
-        for i in range(max_num_of_steps, 1, -1):
-            step = (self.differential_equation.x - self.differential_equation.x0) / i
-            max_gte = self.method_implementation(step, False, True, calculate_next)
+        steps, max_gtes = _gte_sweep(float(de.x0), float(de.x), float(de.y0), max_num_of_steps, self.method_id)
 
-            self.graph_editor.gte_investigation_graph.scatter(step, max_gte, s=2, color=self.method_color,
-                                                              label=self.method_name)
+        self.graph_editor.draw_points(self.graph_editor.gte_investigation_graph, steps, max_gtes, self.method_color,
+                                      self.method_name)
 
 
 class EulerMethod(NumericalMethod):
     def __init__(self, step, differential_equation, graph_editor):
-        NumericalMethod.__init__(self, step, differential_equation, graph_editor, 'euler', 'green')
-
-    def euler_next(self, x_prev, y_prev):
-        return y_prev + self.step * DifferentialEquation.get_y_prime(x_prev, y_prev)
+        NumericalMethod.__init__(self, step, differential_equation, graph_editor, 'euler', 'green', EULER)
 
 
 class ImproverEuler(NumericalMethod):
     def __init__(self, step, differential_equation, graph_editor):
-        NumericalMethod.__init__(self, step, differential_equation, graph_editor, 'improved_euler', 'blue')
-
-    def improved_euler_next(self, x_prev, y_prev):
-        return y_prev + self.step * \
-               DifferentialEquation.get_y_prime(x_prev + self.step / 2, y_prev + self.step / 2 *
-                                                DifferentialEquation.get_y_prime(x_prev, y_prev))
+        NumericalMethod.__init__(self, step, differential_equation, graph_editor, 'improved_euler', 'blue',
+                                 IMPROVED_EULER)
 
 
 class RungeKutta(NumericalMethod):
     def __init__(self, step, differential_equation, graph_editor):
-        NumericalMethod.__init__(self, step, differential_equation, graph_editor, 'runge_kutta', 'orange')
-
-    def runge_kutta_next(self, x_prev, y_prev):
-        k1 = DifferentialEquation.get_y_prime(x_prev, y_prev)
-        k2 = DifferentialEquation.get_y_prime(x_prev + self.step / 2, y_prev + self.step * k1 / 2)
-        k3 = DifferentialEquation.get_y_prime(x_prev + self.step / 2, y_prev + self.step * k2 / 2)
-        k4 = DifferentialEquation.get_y_prime(x_prev + self.step, y_prev + self.step * k3)
-        k_sum = k1 + 2 * k2 + 2 * k3 + k4
-
-        return y_prev + self.step / 6 * k_sum
+        NumericalMethod.__init__(self, step, differential_equation, graph_editor, 'runge_kutta', 'orange',
+                                 RUNGE_KUTTA)
 
 
 class UserWorkspace:
@@ -210,13 +307,16 @@ class UserWorkspace:
         while True:
             if ans == '1':
                 print('enter X0 value, please:')
-                x0 = int(input())
+                x0 = float(input())
                 print('enter Y0 value, please:')
-                y0 = int(input())
+                y0 = float(input())
                 print('enter X value, please:')
-                x = int(input())
+                x = float(input())
                 print('enter STEP value, please:')
                 step = float(input())
+                if step == 0 or (x - x0) / step < 0:
+                    print('incorrect values: X must be reachable from X0 with a non-zero STEP, try again')
+                    continue
                 print('thank you!')
                 self.X0, self.Y0, self.X, self.STEP = x0, y0, x, step
                 break
@@ -243,20 +343,20 @@ class UserWorkspace:
                 ans = input()
 
     def generate_methods(self):
-        diff_eq = DifferentialEquation(self.X0, self.X, self.Y0, self.gr_edit)
+        diff_eq = DifferentialEquation(self.X0, self.X, self.Y0, self.STEP, self.gr_edit)
         diff_eq.exact_solution(self.STEP)
 
         euler_method = EulerMethod(self.STEP, diff_eq, self.gr_edit)
-        euler_method.method_implementation(self.STEP, True, False, euler_method.euler_next)
-        euler_method.gte_investigation(euler_method.euler_next, self.MAX_NUM_OF_STEPS)
+        euler_method.method_implementation(self.STEP, True, False)
+        euler_method.gte_investigation(self.MAX_NUM_OF_STEPS)
 
         improved_euler = ImproverEuler(self.STEP, diff_eq, self.gr_edit)
-        improved_euler.method_implementation(self.STEP, True, False, improved_euler.improved_euler_next)
-        improved_euler.gte_investigation(improved_euler.improved_euler_next, self.MAX_NUM_OF_STEPS)
+        improved_euler.method_implementation(self.STEP, True, False)
+        improved_euler.gte_investigation(self.MAX_NUM_OF_STEPS)
 
         runge_kutta = RungeKutta(self.STEP, diff_eq, self.gr_edit)
-        runge_kutta.method_implementation(self.STEP, True, False, runge_kutta.runge_kutta_next)
-        runge_kutta.gte_investigation(runge_kutta.runge_kutta_next, self.MAX_NUM_OF_STEPS)
+        runge_kutta.method_implementation(self.STEP, True, False)
+        runge_kutta.gte_investigation(self.MAX_NUM_OF_STEPS)
 
     def generate_graphs(self):
         self.gr_edit.generate_solution_graph()